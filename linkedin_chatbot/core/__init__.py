@@ -1,7 +1,21 @@
 """
 Módulo core con la lógica principal del chatbot
 """
-from .chatbot import LinkedinChatbot
-from .api_client import OpenAIClient
-
 __all__ = ['LinkedinChatbot', 'OpenAIClient']
+
+
+def __getattr__(name):
+    """
+    Carga perezosa de los submódulos (PEP 562)
+
+    Importar core no arrastra openai/httpx/pydantic hasta que alguien
+    accede realmente a LinkedinChatbot u OpenAIClient, lo que reduce la
+    latencia de arranque del CLI.
+    """
+    if name == 'LinkedinChatbot':
+        from .chatbot import LinkedinChatbot
+        return LinkedinChatbot
+    if name == 'OpenAIClient':
+        from .api_client import OpenAIClient
+        return OpenAIClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
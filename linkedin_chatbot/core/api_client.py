@@ -1,198 +1,1025 @@
-"""
-Cliente para interactuar con la API de OpenAI usando Structured Outputs
-"""
-import os
-from typing import Optional
-from openai import OpenAI, OpenAIError
-from pydantic import ValidationError
-from models.linkedin_post import LinkedinPost
-
-
-class OpenAIClient:
-    """
-    Cliente para generar posts de LinkedIn usando OpenAI con Structured Outputs
-    """
-    
-    # Modelos compatibles con Structured Outputs
-    COMPATIBLE_MODELS = [
-        "gpt-4o-2024-08-06",
-        "gpt-4o",
-        "gpt-4o-mini",
-        "gpt-4-turbo"
-    ]
-    
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-2024-08-06"):
-        """
-        Inicializa el cliente de OpenAI
-        
-        Args:
-            api_key: API key de OpenAI. Si no se proporciona, se busca en variable de entorno
-            model: Modelo a utilizar (debe ser compatible con Structured Outputs)
-        
-        Raises:
-            ValueError: Si no se proporciona API key o el modelo no es compatible
-        """
-        # Obtener API key
-        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        
-        if not self.api_key:
-            raise ValueError(
-                "No se encontró la API key de OpenAI. "
-                "Proporciona api_key como parámetro o configura la variable de entorno OPENAI_API_KEY"
-            )
-        
-        # Validar modelo
-        if model not in self.COMPATIBLE_MODELS:
-            print(f"⚠️  Advertencia: El modelo '{model}' puede no ser compatible con Structured Outputs.")
-            print(f"   Modelos recomendados: {', '.join(self.COMPATIBLE_MODELS)}")
-        
-        self.model = model
-        
-        # Inicializar cliente de OpenAI
-        try:
-            self.client = OpenAI(api_key=self.api_key)
-        except Exception as e:
-            raise ValueError(f"Error inicializando cliente de OpenAI: {str(e)}")
-        
-        # Prompt del sistema optimizado para LinkedIn
-        self.system_prompt = """Eres un experto en crear contenido profesional para LinkedIn.
-        
-Tu tarea es generar posts atractivos, profesionales y de alta calidad que generen engagement.
-
-Directrices para crear el contenido:
-1. TÍTULO: Debe ser llamativo, conciso y captar la atención (máximo 100 caracteres)
-2. CONTENIDO: 
-   - Escribe entre 200-500 palabras
-   - Usa un tono profesional pero cercano
-   - Incluye valor real para el lector
-   - Estructura el texto con párrafos cortos y fáciles de leer
-   - Usa emojis estratégicamente para mejorar la legibilidad (máximo 3-5)
-   - Incluye una llamada a la acción al final
-3. HASHTAGS:
-   - Proporciona entre 3 y 10 hashtags relevantes
-   - Mezcla hashtags populares y específicos
-   - No incluyas el símbolo # (se agregará automáticamente)
-4. CATEGORÍA:
-   - Elige la categoría más apropiada: tecnología, negocios, marketing, liderazgo, 
-     desarrollo profesional, industria, innovación, recursos humanos
-
-Adapta el tono y contenido según la idea proporcionada por el usuario."""
-    
-    def generate_linkedin_post(self, user_idea: str) -> LinkedinPost:
-        """
-        Genera un post de LinkedIn estructurado usando Structured Outputs
-        
-        Args:
-            user_idea: Idea o tema del post proporcionado por el usuario
-        
-        Returns:
-            LinkedinPost: Objeto validado con el post generado
-        
-        Raises:
-            ValueError: Si hay error en la validación o generación del contenido
-            OpenAIError: Si hay error en la comunicación con la API
-        """
-        if not user_idea or not user_idea.strip():
-            raise ValueError("Debes proporcionar una idea para el post")
-        
-        try:
-            # Crear el mensaje del usuario
-            user_message = f"""Genera un post profesional de LinkedIn sobre el siguiente tema:
-
-"{user_idea.strip()}"
-
-Asegúrate de crear contenido valioso, relevante y que genere engagement."""
-            
-            # Llamada a la API usando chat.completions.parse con response_format
-            response = self.client.chat.completions.parse(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format=LinkedinPost,  # Structured Output con Pydantic
-                temperature=0.7,  # Balance entre creatividad y coherencia
-                max_tokens=2000
-            )
-            
-            # Verificar si hay refusal (rechazo del modelo)
-            if response.choices[0].message.refusal:
-                refusal_message = response.choices[0].message.refusal
-                raise ValueError(
-                    f"La API rechazó generar el contenido: {refusal_message}\n"
-                    "Esto puede deberse a que el tema viola las políticas de uso de OpenAI."
-                )
-            
-            # Obtener el objeto parseado automáticamente
-            linkedin_post = response.choices[0].message.parsed
-            
-            if not linkedin_post:
-                raise ValueError(
-                    "La API no devolvió un post válido. "
-                    "Esto puede ocurrir si el modelo no pudo generar contenido estructurado."
-                )
-            
-            return linkedin_post
-        
-        except ValidationError as e:
-            # Error de validación de Pydantic
-            error_messages = []
-            for error in e.errors():
-                field = ' -> '.join(str(loc) for loc in error['loc'])
-                message = error['msg']
-                error_messages.append(f"  - {field}: {message}")
-            
-            raise ValueError(
-                "Error en la validación del post generado:\n" + 
-                '\n'.join(error_messages) +
-                "\n\nPor favor, intenta con una idea diferente o más específica."
-            )
-        
-        except OpenAIError as e:
-            # Errores específicos de la API de OpenAI
-            error_msg = str(e)
-            
-            if "rate_limit" in error_msg.lower():
-                raise OpenAIError(
-                    "Se alcanzó el límite de tasa de la API. "
-                    "Por favor, espera unos momentos antes de intentar de nuevo."
-                )
-            elif "insufficient_quota" in error_msg.lower():
-                raise OpenAIError(
-                    "Cuota insuficiente en tu cuenta de OpenAI. "
-                    "Verifica tu saldo en https://platform.openai.com/usage"
-                )
-            elif "invalid_api_key" in error_msg.lower():
-                raise OpenAIError(
-                    "API key inválida. Verifica que tu OPENAI_API_KEY sea correcta."
-                )
-            else:
-                raise OpenAIError(f"Error de la API de OpenAI: {error_msg}")
-        
-        except Exception as e:
-            # Cualquier otro error inesperado
-            raise ValueError(
-                f"Error inesperado al generar el post: {str(e)}\n"
-                "Por favor, intenta de nuevo o contacta al soporte."
-            )
-    
-    def test_connection(self) -> bool:
-        """
-        Verifica que la conexión con OpenAI funcione correctamente
-        
-        Returns:
-            bool: True si la conexión es exitosa
-        
-        Raises:
-            Exception: Si hay algún problema con la conexión
-        """
-        try:
-            # Hacer una llamada simple para verificar la conexión
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            return True
-        except Exception as e:
-            raise Exception(f"Error al probar la conexión con OpenAI: {str(e)}")
+"""
+Cliente para interactuar con la API de OpenAI usando Structured Outputs
+"""
+import asyncio
+import hashlib
+import os
+from typing import List, Optional
+import diskcache
+import orjson
+import zstandard
+import httpx
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    AuthenticationError,
+    InternalServerError,
+    OpenAIError,
+    RateLimitError,
+)
+from pydantic import ValidationError
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from models.linkedin_post import (
+    LinkedinPost,
+    PostBatch,
+    LINKEDIN_POST_SCHEMA,
+    POST_BATCH_SCHEMA,
+)
+
+
+# response_format preconstruidos con los esquemas cacheados: el SDK ya no
+# tiene que volver a serializar los modelos Pydantic en cada llamada
+_LINKEDIN_POST_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "LinkedinPost",
+        "strict": True,
+        "schema": LINKEDIN_POST_SCHEMA
+    }
+}
+
+_POST_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "PostBatch",
+        "strict": True,
+        "schema": POST_BATCH_SCHEMA
+    }
+}
+
+
+# Contextos zstd compartidos para el caché de posts: comprimir cada entrada
+# (~4x menos bytes) reduce la E/S por acierto; descomprimir es más rápido
+# que leer los bytes extra del disco en la mayoría de sistemas
+_ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+
+
+def _es_error_transitorio(error: BaseException) -> bool:
+    """
+    Decide si un error de la API merece reintento
+
+    Los timeouts, fallos de conexión y 5xx son transitorios. Los 429 lo
+    son solo si se deben al límite de tasa: un 429 por falta de saldo
+    (insufficient_quota) no se arregla esperando, así que se propaga
+    de inmediato en lugar de quemar 8 intentos con backoff.
+    """
+    if isinstance(error, RateLimitError):
+        return getattr(error, 'code', None) != 'insufficient_quota'
+    return isinstance(error, (APITimeoutError, APIConnectionError, InternalServerError))
+
+
+class OpenAIClient:
+    """
+    Cliente para generar posts de LinkedIn usando OpenAI con Structured Outputs
+    """
+
+    # Modelos compatibles con Structured Outputs
+    COMPATIBLE_MODELS = [
+        "gpt-4o-2024-08-06",
+        "gpt-4o",
+        "gpt-4o-mini",
+        "gpt-4-turbo"
+    ]
+
+    # Directorio del caché local de posts generados
+    CACHE_DIR = ".post_cache"
+
+    # Tope de tokens de salida por post. El esquema limita el contenido a
+    # 3000 caracteres (~750 tokens) más el andamiaje JSON y los hashtags,
+    # así que 1100 deja margen de sobra. Pedir 2000 solo inflaba la reserva
+    # que OpenAI descuenta del límite TPM, provocando 429 antes de tiempo.
+    MAX_COMPLETION_TOKENS = 1100
+
+    # Tope absoluto al que puede subir el ajuste dinámico
+    MAX_COMPLETION_TOKENS_CEILING = 2000
+
+    # Máximo de tokens de salida que acepta la API en una sola completion
+    # (gpt-4o y gpt-4o-mini): pedir más devuelve un 400 inmediato
+    API_COMPLETION_TOKENS_LIMIT = 16384
+
+    # Umbral a partir del cual OpenAI cachea el prefijo del prompt
+    PROMPT_CACHE_THRESHOLD = 1024
+
+    # Prompt del sistema optimizado para LinkedIn. La guía de estilo ampliada
+    # es deliberadamente extensa y estable: empuja el prompt por encima del
+    # umbral de 1024 tokens para que OpenAI lo sirva desde su caché de
+    # prefijos (50% del coste y menor latencia al primer token). No lo
+    # modifiques entre llamadas: cualquier cambio de un byte invalida el caché.
+    SYSTEM_PROMPT = """Eres un experto en crear contenido profesional para LinkedIn.
+
+Tu tarea es generar posts atractivos, profesionales y de alta calidad que generen engagement.
+
+Directrices para crear el contenido:
+1. TÍTULO: Debe ser llamativo, conciso y captar la atención (máximo 100 caracteres)
+2. CONTENIDO:
+   - Escribe entre 200-500 palabras
+   - Usa un tono profesional pero cercano
+   - Incluye valor real para el lector
+   - Estructura el texto con párrafos cortos y fáciles de leer
+   - Usa emojis estratégicamente para mejorar la legibilidad (máximo 3-5)
+   - Incluye una llamada a la acción al final
+3. HASHTAGS:
+   - Proporciona entre 3 y 10 hashtags relevantes
+   - Mezcla hashtags populares y específicos
+   - No incluyas el símbolo # (se agregará automáticamente)
+4. CATEGORÍA:
+   - Elige la categoría más apropiada: tecnología, negocios, marketing, liderazgo,
+     desarrollo profesional, industria, innovación, recursos humanos
+
+GUÍA DE ESTILO AMPLIADA
+
+Sobre el gancho inicial:
+   - La primera línea decide si el lector pulsa "ver más": plantea una pregunta,
+     un dato sorprendente, una afirmación contraintuitiva o una mini-historia.
+   - Evita empezar con "Hoy quiero hablar de..." o "En este post...": son
+     arranques débiles que no aportan nada al lector.
+   - El gancho debe conectar directamente con el beneficio que obtendrá el
+     lector si sigue leyendo.
+
+Sobre la estructura del cuerpo:
+   - Párrafos de una a tres líneas como máximo; en LinkedIn el espacio en
+     blanco es parte del diseño del texto.
+   - Usa listas con guiones o números cuando enumeres pasos, errores,
+     aprendizajes o recursos: se escanean mejor que la prosa corrida.
+   - Una sola idea central por post; si aparecen dos temas fuertes, elige el
+     más concreto y deja el otro fuera.
+   - Alterna frases cortas y medias para dar ritmo; evita subordinadas largas.
+   - Cierra el cuerpo con una conclusión clara antes de la llamada a la acción,
+     de modo que el post tenga sentido completo incluso sin leer el final.
+
+Sobre el tono y la voz:
+   - Escribe en primera persona y dirígete al lector de tú.
+   - Profesional no significa frío: se valora la cercanía, los ejemplos
+     personales y admitir errores propios cuando son relevantes.
+   - Evita la jerga corporativa vacía ("sinergias", "poner en valor",
+     "alinear stakeholders") salvo que el tema lo exija.
+   - Nada de clickbait: el contenido debe cumplir lo que el título promete.
+   - Sé concreto: cifras, plazos y ejemplos reales convencen más que adjetivos.
+
+Sobre los emojis:
+   - Un emoji al inicio de un bloque funciona como viñeta visual.
+   - Nunca más de un emoji por párrafo ni emojis en medio de una frase.
+   - Elige emojis neutros y profesionales; evita los ambiguos o informales.
+
+Sobre la llamada a la acción final:
+   - Una sola llamada a la acción, clara y de fricción baja: una pregunta
+     abierta a comentarios, una invitación a compartir experiencia propia o a
+     guardar el post para releerlo.
+   - Evita pedir varias cosas a la vez (comenta, comparte, sígueme): diluye
+     la respuesta del lector.
+
+Sobre los hashtags:
+   - Dos o tres hashtags amplios de la temática (por ejemplo, de tecnología o
+     negocios en general) y el resto específicos del nicho del post.
+   - En una sola palabra usa minúsculas; en palabras compuestas usa
+     CamelCase para que sean legibles.
+   - No inventes hashtags imposibles de buscar ni repitas el mismo concepto
+     con dos grafías distintas.
+
+Sobre la categoría:
+   - Clasifica por el tema dominante del contenido, no por el sector del
+     autor: un post sobre cómo liderar un equipo técnico es "liderazgo",
+     aunque hable de tecnología.
+   - Ante la duda entre dos categorías, elige la que mejor describa el
+     beneficio principal que recibe el lector.
+
+Errores que debes evitar siempre:
+   - Muros de texto sin saltos de línea.
+   - Promesas genéricas sin ejemplos ni datos que las respalden.
+   - Tono de nota de prensa o de folleto comercial.
+   - Cerrar sin conclusión ni llamada a la acción.
+   - Hashtags irrelevantes o de relleno.
+
+Sobre la longitud y el formato final:
+   - Respeta siempre el rango de 200 a 500 palabras: por debajo el post
+     parece superficial y por encima LinkedIn corta la vista previa.
+   - No uses negritas simuladas con caracteres unicode ni mayúsculas
+     sostenidas: dificultan la lectura y penalizan la accesibilidad.
+   - No incluyas enlaces en el cuerpo; si la idea exige uno, sugiere
+     mencionarlo en el primer comentario.
+   - Revisa la ortografía y los acentos: un solo error visible resta
+     credibilidad a todo el post.
+
+Adapta el tono y contenido según la idea proporcionada por el usuario."""
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-2024-08-06",
+                 use_cache: bool = True):
+        """
+        Inicializa el cliente de OpenAI
+
+        Args:
+            api_key: API key de OpenAI. Si no se proporciona, se busca en variable de entorno
+            model: Modelo a utilizar (debe ser compatible con Structured Outputs)
+            use_cache: Si se reutilizan posts ya generados para la misma idea
+
+        Raises:
+            ValueError: Si no se proporciona API key o el modelo no es compatible
+        """
+        # Obtener API key
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+
+        if not self.api_key:
+            raise ValueError(
+                "No se encontró la API key de OpenAI. "
+                "Proporciona api_key como parámetro o configura la variable de entorno OPENAI_API_KEY"
+            )
+
+        # Validar modelo
+        if model not in self.COMPATIBLE_MODELS:
+            print(f"⚠️  Advertencia: El modelo '{model}' puede no ser compatible con Structured Outputs.")
+            print(f"   Modelos recomendados: {', '.join(self.COMPATIBLE_MODELS)}")
+
+        self.model = model
+
+        # El cliente asíncrono se construye de forma perezosa en la property
+        # `client`, ligado al bucle de eventos que lo use (ver docstring)
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+
+        # Prompt del sistema optimizado para LinkedIn. Se usa la constante de
+        # clase tal cual (byte a byte) y siempre como primer mensaje: OpenAI
+        # cachea automáticamente prefijos idénticos de ≥1024 tokens y los
+        # cobra a mitad de precio, además de responder antes.
+        self.system_prompt = self.SYSTEM_PROMPT
+
+        # Estimar los tokens del prompt para confirmar que supera el umbral
+        self._prompt_tokens = self._count_prompt_tokens()
+        if self._prompt_tokens < self.PROMPT_CACHE_THRESHOLD:
+            print(f"⚠️  El prompt del sistema tiene ~{self._prompt_tokens} tokens, "
+                  f"por debajo del umbral de caché de {self.PROMPT_CACHE_THRESHOLD}.")
+
+        # Caché local de posts: repetir la misma idea (habitual al iterar o
+        # en demos) devuelve el post guardado sin volver a facturar la API.
+        self.use_cache = use_cache
+        self._cache = diskcache.Cache(self.CACHE_DIR) if use_cache else None
+
+        # Tope de tokens por post, ajustable si algún post lo roza
+        self.max_tokens = self.MAX_COMPLETION_TOKENS
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        Cliente AsyncOpenAI ligado al bucle de eventos en ejecución
+
+        Las conexiones keepalive del pool de httpx quedan atadas al loop
+        que las creó. Los wrappers síncronos ejecutan cada llamada en un
+        asyncio.run propio, así que reutilizar el cliente de un loop ya
+        cerrado fallaría con "Event loop is closed" en la segunda llamada:
+        si el loop cambió, se construye un cliente nuevo. En el flujo
+        asíncrono normal el loop no cambia y el cliente (con su pool) se
+        crea una sola vez.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Pool de conexiones keepalive: reutilizar la conexión TCP/TLS
+            # entre llamadas elimina el handshake por petición y permite
+            # solapar varias peticiones en vuelo.
+            try:
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                    http2=True,
+                    timeout=60
+                )
+                self._client = AsyncOpenAI(api_key=self.api_key, http_client=self._http_client)
+            except Exception as e:
+                raise ValueError(f"Error inicializando cliente de OpenAI: {str(e)}")
+            self._client_loop = loop
+        return self._client
+
+    def _run_sync(self, coro):
+        """
+        Ejecuta una corrutina en un loop propio cerrando el cliente al final
+
+        Las conexiones del pool quedan ligadas al loop de este asyncio.run;
+        cerrarlas antes de que el loop termine evita que la siguiente
+        llamada síncrona intente reutilizar una conexión muerta.
+        """
+        async def _con_cierre():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+
+        return asyncio.run(_con_cierre())
+
+    def _count_prompt_tokens(self) -> int:
+        """
+        Cuenta (o estima) los tokens del prompt del sistema
+
+        Usa tiktoken si está instalado; si no, estima a ~4 caracteres por
+        token, suficiente para comprobar el umbral de caché.
+        """
+        try:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model("gpt-4o")
+            return len(encoding.encode(self.system_prompt))
+        except Exception:
+            return len(self.system_prompt) // 4
+
+    def _check_completion_usage(self, response):
+        """
+        Vigila el consumo de tokens de salida y sube el tope si hace falta
+
+        Si un post se acerca al límite solicitado, el siguiente habría
+        salido truncado (finish_reason 'length'); avisamos y subimos el
+        tope dinámicamente hasta el techo absoluto. Con LINKEDIN_CHATBOT_DEBUG
+        definido, también muestra cuántos tokens del prompt sirvió el caché
+        de prefijos de OpenAI.
+        """
+        usage = getattr(response, 'usage', None)
+
+        if usage and os.getenv('LINKEDIN_CHATBOT_DEBUG'):
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached = getattr(details, 'cached_tokens', 0) or 0 if details else 0
+            print(f"🔍 [debug] prompt_tokens={usage.prompt_tokens}, "
+                  f"cacheados={cached}, completion_tokens={usage.completion_tokens}")
+        if usage and usage.completion_tokens > self.max_tokens - 100:
+            nuevo_tope = min(self.max_tokens * 2, self.MAX_COMPLETION_TOKENS_CEILING)
+            if nuevo_tope > self.max_tokens:
+                print(f"⚠️  El post usó {usage.completion_tokens} tokens, cerca del "
+                      f"tope de {self.max_tokens}. Subiendo el tope a {nuevo_tope}.")
+                self.max_tokens = nuevo_tope
+
+    def _cache_key(self, user_idea: str) -> str:
+        """
+        Calcula la clave de caché para una idea
+
+        La clave incluye el modelo y el prompt del sistema, de modo que
+        cambiar cualquiera de los dos invalida las entradas antiguas.
+        """
+        raw = f"{self.model}|{self.system_prompt}|{user_idea.strip().lower()}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _post_from_cache(cached) -> LinkedinPost:
+        """
+        Reconstruye un post desde una entrada del caché
+
+        Las entradas nuevas son JSON comprimido con zstd (bytes); las
+        de versiones anteriores eran JSON plano y se aceptan tal cual.
+        """
+        if isinstance(cached, bytes):
+            cached = _ZSTD_DECOMPRESSOR.decompress(cached)
+        return LinkedinPost.model_validate_json(cached)
+
+    def clear_cache(self) -> int:
+        """
+        Vacía el caché local de posts
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        if self._cache is None:
+            return 0
+        count = len(self._cache)
+        self._cache.clear()
+        return count
+
+    @retry(
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(8),
+        retry=retry_if_exception(_es_error_transitorio),
+        reraise=True
+    )
+    async def _parse_with_retry(self, **kwargs):
+        """
+        Llama a chat.completions.parse con reintentos automáticos
+
+        Los errores transitorios (429 de límite de tasa, timeouts, fallos
+        de conexión y 5xx) se reintentan con backoff exponencial y jitter,
+        hasta 8 intentos. Un 429 por cuota agotada no es transitorio y se
+        propaga sin reintentar. Si la API indica un Retry-After, se respeta
+        antes de reintentar.
+        """
+        try:
+            return await self.client.chat.completions.parse(**kwargs)
+        except RateLimitError as e:
+            # Respetar el Retry-After de la API antes del backoff exponencial
+            retry_after = e.response.headers.get('retry-after') if e.response is not None else None
+            if retry_after:
+                try:
+                    await asyncio.sleep(float(retry_after))
+                except ValueError:
+                    pass
+            raise
+
+    @retry(
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(8),
+        retry=retry_if_exception(_es_error_transitorio),
+        reraise=True
+    )
+    async def _stream_with_retry(self, on_delta=None, **kwargs):
+        """
+        Consume chat.completions.stream con reintentos automáticos
+
+        Misma política que _parse_with_retry: errores transitorios con
+        backoff exponencial y jitter, hasta 8 intentos, respetando el
+        Retry-After de la API. Si la conexión cae a mitad de stream, el
+        reintento vuelve a empezar desde cero y on_delta puede recibir
+        fragmentos ya emitidos.
+
+        Returns:
+            ChatCompletion: La respuesta final ya ensamblada
+        """
+        try:
+            async with self.client.chat.completions.stream(**kwargs) as stream:
+                async for event in stream:
+                    if event.type == 'content.delta' and on_delta:
+                        on_delta(event.delta)
+
+                return await stream.get_final_completion()
+        except RateLimitError as e:
+            # Respetar el Retry-After de la API antes del backoff exponencial
+            retry_after = e.response.headers.get('retry-after') if e.response is not None else None
+            if retry_after:
+                try:
+                    await asyncio.sleep(float(retry_after))
+                except ValueError:
+                    pass
+            raise
+
+    async def agenerate_linkedin_post(self, user_idea: str) -> LinkedinPost:
+        """
+        Genera un post de LinkedIn estructurado usando Structured Outputs (asíncrono)
+
+        Varias llamadas pueden ejecutarse en paralelo con asyncio.gather,
+        solapando la latencia de red que domina el tiempo total.
+
+        Args:
+            user_idea: Idea o tema del post proporcionado por el usuario
+
+        Returns:
+            LinkedinPost: Objeto validado con el post generado
+
+        Raises:
+            ValueError: Si hay error en la validación o generación del contenido
+            OpenAIError: Si hay error en la comunicación con la API
+        """
+        if not user_idea or not user_idea.strip():
+            raise ValueError("Debes proporcionar una idea para el post")
+
+        # Buscar en el caché antes de tocar la red
+        cache_key = None
+        if self._cache is not None:
+            cache_key = self._cache_key(user_idea)
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return self._post_from_cache(cached)
+
+        try:
+            # Crear el mensaje del usuario
+            user_message = f"""Genera un post profesional de LinkedIn sobre el siguiente tema:
+
+"{user_idea.strip()}"
+
+Asegúrate de crear contenido valioso, relevante y que genere engagement."""
+
+            # Llamada a la API usando chat.completions.parse con response_format
+            response = await self._parse_with_retry(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                response_format=_LINKEDIN_POST_RESPONSE_FORMAT,  # Esquema cacheado
+                temperature=0.7,  # Balance entre creatividad y coherencia
+                max_tokens=self.max_tokens
+            )
+
+            # Verificar si hay refusal (rechazo del modelo)
+            if response.choices[0].message.refusal:
+                refusal_message = response.choices[0].message.refusal
+                raise ValueError(
+                    f"La API rechazó generar el contenido: {refusal_message}\n"
+                    "Esto puede deberse a que el tema viola las políticas de uso de OpenAI."
+                )
+
+            # Validar el JSON devuelto contra el modelo Pydantic
+            content = response.choices[0].message.content
+
+            if not content:
+                raise ValueError(
+                    "La API no devolvió un post válido. "
+                    "Esto puede ocurrir si el modelo no pudo generar contenido estructurado."
+                )
+
+            linkedin_post = LinkedinPost.model_validate_json(content)
+
+            # Vigilar el consumo de tokens por si hay que subir el tope
+            self._check_completion_usage(response)
+
+            # Guardar en el caché para futuras repeticiones de la idea
+            if self._cache is not None:
+                self._cache.set(
+                    cache_key,
+                    _ZSTD_COMPRESSOR.compress(linkedin_post.model_dump_json().encode('utf-8'))
+                )
+
+            return linkedin_post
+
+        except ValidationError as e:
+            # Error de validación de Pydantic
+            error_messages = []
+            for error in e.errors():
+                field = ' -> '.join(str(loc) for loc in error['loc'])
+                message = error['msg']
+                error_messages.append(f"  - {field}: {message}")
+
+            raise ValueError(
+                "Error en la validación del post generado:\n" +
+                '\n'.join(error_messages) +
+                "\n\nPor favor, intenta con una idea diferente o más específica."
+            )
+
+        except RateLimitError as e:
+            # El SDK usa 429 tanto para límite de tasa como para falta de saldo
+            if getattr(e, 'code', None) == 'insufficient_quota':
+                raise OpenAIError(
+                    "Cuota insuficiente en tu cuenta de OpenAI. "
+                    "Verifica tu saldo en https://platform.openai.com/usage"
+                )
+            raise OpenAIError(
+                "Se alcanzó el límite de tasa de la API. "
+                "Por favor, espera unos momentos antes de intentar de nuevo."
+            )
+
+        except AuthenticationError:
+            raise OpenAIError(
+                "API key inválida. Verifica que tu OPENAI_API_KEY sea correcta."
+            )
+
+        except APIStatusError as e:
+            raise OpenAIError(f"Error de la API de OpenAI (HTTP {e.status_code}): {str(e)}")
+
+        except OpenAIError as e:
+            raise OpenAIError(f"Error de la API de OpenAI: {str(e)}")
+
+        except Exception as e:
+            # Cualquier otro error inesperado
+            raise ValueError(
+                f"Error inesperado al generar el post: {str(e)}\n"
+                "Por favor, intenta de nuevo o contacta al soporte."
+            )
+
+    async def astream_linkedin_post(self, user_idea: str, on_delta=None) -> LinkedinPost:
+        """
+        Genera un post de LinkedIn emitiendo el contenido a medida que llega
+
+        El primer token llega en una fracción del tiempo total de la
+        respuesta, así que el usuario ve contenido casi de inmediato en
+        lugar de esperar la respuesta completa. El parseo estructurado se
+        solapa con la recepción de la red.
+
+        Args:
+            user_idea: Idea o tema del post proporcionado por el usuario
+            on_delta: Callback opcional que recibe cada fragmento de texto
+                      según se genera
+
+        Returns:
+            LinkedinPost: Objeto validado con el post generado
+
+        Raises:
+            ValueError: Si hay error en la validación o generación del contenido
+            OpenAIError: Si hay error en la comunicación con la API
+        """
+        if not user_idea or not user_idea.strip():
+            raise ValueError("Debes proporcionar una idea para el post")
+
+        # Buscar en el caché antes de tocar la red
+        cache_key = None
+        if self._cache is not None:
+            cache_key = self._cache_key(user_idea)
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return self._post_from_cache(cached)
+
+        try:
+            # Crear el mensaje del usuario
+            user_message = f"""Genera un post profesional de LinkedIn sobre el siguiente tema:
+
+"{user_idea.strip()}"
+
+Asegúrate de crear contenido valioso, relevante y que genere engagement."""
+
+            # Streaming con parseo incremental del Structured Output y la
+            # misma política de reintentos que la vía sin streaming
+            response = await self._stream_with_retry(
+                on_delta=on_delta,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                response_format=_LINKEDIN_POST_RESPONSE_FORMAT,  # Esquema cacheado
+                temperature=0.7,  # Balance entre creatividad y coherencia
+                max_tokens=self.max_tokens
+            )
+
+            # Verificar si hay refusal (rechazo del modelo)
+            if response.choices[0].message.refusal:
+                refusal_message = response.choices[0].message.refusal
+                raise ValueError(
+                    f"La API rechazó generar el contenido: {refusal_message}\n"
+                    "Esto puede deberse a que el tema viola las políticas de uso de OpenAI."
+                )
+
+            # Validar el JSON devuelto contra el modelo Pydantic
+            content = response.choices[0].message.content
+
+            if not content:
+                raise ValueError(
+                    "La API no devolvió un post válido. "
+                    "Esto puede ocurrir si el modelo no pudo generar contenido estructurado."
+                )
+
+            linkedin_post = LinkedinPost.model_validate_json(content)
+
+            # Vigilar el consumo de tokens por si hay que subir el tope
+            self._check_completion_usage(response)
+
+            # Guardar en el caché para futuras repeticiones de la idea
+            if self._cache is not None:
+                self._cache.set(
+                    cache_key,
+                    _ZSTD_COMPRESSOR.compress(linkedin_post.model_dump_json().encode('utf-8'))
+                )
+
+            return linkedin_post
+
+        except ValidationError as e:
+            # Error de validación de Pydantic
+            error_messages = []
+            for error in e.errors():
+                field = ' -> '.join(str(loc) for loc in error['loc'])
+                message = error['msg']
+                error_messages.append(f"  - {field}: {message}")
+
+            raise ValueError(
+                "Error en la validación del post generado:\n" +
+                '\n'.join(error_messages) +
+                "\n\nPor favor, intenta con una idea diferente o más específica."
+            )
+
+        except RateLimitError as e:
+            # El SDK usa 429 tanto para límite de tasa como para falta de saldo
+            if getattr(e, 'code', None) == 'insufficient_quota':
+                raise OpenAIError(
+                    "Cuota insuficiente en tu cuenta de OpenAI. "
+                    "Verifica tu saldo en https://platform.openai.com/usage"
+                )
+            raise OpenAIError(
+                "Se alcanzó el límite de tasa de la API. "
+                "Por favor, espera unos momentos antes de intentar de nuevo."
+            )
+
+        except AuthenticationError:
+            raise OpenAIError(
+                "API key inválida. Verifica que tu OPENAI_API_KEY sea correcta."
+            )
+
+        except APIStatusError as e:
+            raise OpenAIError(f"Error de la API de OpenAI (HTTP {e.status_code}): {str(e)}")
+
+        except OpenAIError as e:
+            raise OpenAIError(f"Error de la API de OpenAI: {str(e)}")
+
+        except Exception as e:
+            # Cualquier otro error inesperado
+            raise ValueError(
+                f"Error inesperado al generar el post: {str(e)}\n"
+                "Por favor, intenta de nuevo o contacta al soporte."
+            )
+
+    def stream_linkedin_post(self, user_idea: str, on_delta=None) -> LinkedinPost:
+        """
+        Versión síncrona de astream_linkedin_post (compatibilidad hacia atrás)
+
+        Args:
+            user_idea: Idea o tema del post proporcionado por el usuario
+            on_delta: Callback opcional que recibe cada fragmento de texto
+
+        Returns:
+            LinkedinPost: Objeto validado con el post generado
+        """
+        return self._run_sync(self.astream_linkedin_post(user_idea, on_delta=on_delta))
+
+    async def agenerate_linkedin_posts(self, ideas: List[str]) -> List[LinkedinPost]:
+        """
+        Genera varios posts de LinkedIn en una sola llamada a la API
+
+        Enviar todas las ideas en un único mensaje amortiza los tokens del
+        prompt del sistema y la latencia de red entre los N posts, en lugar
+        de pagar ambos una vez por idea.
+
+        Args:
+            ideas: Lista de ideas o temas, uno por post
+
+        Returns:
+            List[LinkedinPost]: Lista de posts validados, uno por idea
+
+        Raises:
+            ValueError: Si hay error en la validación o generación del contenido
+            OpenAIError: Si hay error en la comunicación con la API
+        """
+        ideas = [idea.strip() for idea in ideas if idea and idea.strip()]
+
+        if not ideas:
+            raise ValueError("Debes proporcionar al menos una idea para generar posts")
+
+        try:
+            # Crear un único mensaje con todas las ideas numeradas
+            ideas_numeradas = '\n'.join(f"{i}. {idea}" for i, idea in enumerate(ideas, start=1))
+            user_message = f"""Genera {len(ideas)} posts profesionales de LinkedIn, uno por cada idea numerada:
+
+{ideas_numeradas}
+
+Devuelve los posts en el mismo orden que las ideas. Asegúrate de crear contenido valioso, relevante y que genere engagement."""
+
+            # Una sola llamada a la API para todo el lote
+            response = await self._parse_with_retry(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                response_format=_POST_BATCH_RESPONSE_FORMAT,  # Esquema cacheado
+                temperature=0.7,  # Balance entre creatividad y coherencia
+                # Presupuesto proporcional al lote, sin superar el máximo que
+                # acepta la API por completion (15+ ideas lo desbordarían)
+                max_tokens=min(self.max_tokens * len(ideas), self.API_COMPLETION_TOKENS_LIMIT)
+            )
+
+            # Verificar si hay refusal (rechazo del modelo)
+            if response.choices[0].message.refusal:
+                refusal_message = response.choices[0].message.refusal
+                raise ValueError(
+                    f"La API rechazó generar el contenido: {refusal_message}\n"
+                    "Esto puede deberse a que alguna idea viola las políticas de uso de OpenAI."
+                )
+
+            # Validar el JSON devuelto contra el modelo Pydantic
+            content = response.choices[0].message.content
+
+            if not content:
+                raise ValueError(
+                    "La API no devolvió posts válidos. "
+                    "Esto puede ocurrir si el modelo no pudo generar contenido estructurado."
+                )
+
+            batch = PostBatch.model_validate_json(content)
+
+            # El esquema solo exige un mínimo de 1 post: verificar que el
+            # modelo no haya omitido ninguna idea antes de dar el lote por bueno
+            if len(batch.posts) != len(ideas):
+                raise ValueError(
+                    f"La API devolvió {len(batch.posts)} posts para {len(ideas)} ideas. "
+                    "Por favor, intenta de nuevo o divide el lote en partes más pequeñas."
+                )
+
+            return batch.posts
+
+        except ValidationError as e:
+            # Error de validación de Pydantic
+            error_messages = []
+            for error in e.errors():
+                field = ' -> '.join(str(loc) for loc in error['loc'])
+                message = error['msg']
+                error_messages.append(f"  - {field}: {message}")
+
+            raise ValueError(
+                "Error en la validación de los posts generados:\n" +
+                '\n'.join(error_messages) +
+                "\n\nPor favor, intenta con ideas diferentes o más específicas."
+            )
+
+        except RateLimitError as e:
+            # El SDK usa 429 tanto para límite de tasa como para falta de saldo
+            if getattr(e, 'code', None) == 'insufficient_quota':
+                raise OpenAIError(
+                    "Cuota insuficiente en tu cuenta de OpenAI. "
+                    "Verifica tu saldo en https://platform.openai.com/usage"
+                )
+            raise OpenAIError(
+                "Se alcanzó el límite de tasa de la API. "
+                "Por favor, espera unos momentos antes de intentar de nuevo."
+            )
+
+        except APIStatusError as e:
+            raise OpenAIError(f"Error de la API de OpenAI (HTTP {e.status_code}): {str(e)}")
+
+        except OpenAIError as e:
+            raise OpenAIError(f"Error de la API de OpenAI: {str(e)}")
+
+        except Exception as e:
+            # Cualquier otro error inesperado
+            raise ValueError(
+                f"Error inesperado al generar los posts: {str(e)}\n"
+                "Por favor, intenta de nuevo o contacta al soporte."
+            )
+
+    async def agenerate_linkedin_posts_batch(self, ideas: List[str]) -> List[LinkedinPost]:
+        """
+        Genera posts en masa usando la Batch API de OpenAI
+
+        La Batch API procesa las peticiones en una cola asíncrona con límites
+        de tasa propios (más altos) y un 50% de descuento sobre el precio
+        síncrono, a cambio de una ventana de hasta 24 horas. Es la opción
+        adecuada para generar decenas o cientos de posts sin prisa.
+
+        Args:
+            ideas: Lista de ideas o temas, uno por post
+
+        Returns:
+            List[LinkedinPost]: Lista de posts validados, en el orden de las ideas
+
+        Raises:
+            ValueError: Si hay error en la validación o el lote falla
+            OpenAIError: Si hay error en la comunicación con la API
+        """
+        ideas = [idea.strip() for idea in ideas if idea and idea.strip()]
+
+        if not ideas:
+            raise ValueError("Debes proporcionar al menos una idea para generar posts")
+
+        # Construir el archivo JSONL: una petición por idea. orjson emite
+        # bytes UTF-8 directamente, sin el paso intermedio str -> encode.
+        lines = []
+        for i, idea in enumerate(ideas):
+            user_message = f"""Genera un post profesional de LinkedIn sobre el siguiente tema:
+
+"{idea}"
+
+Asegúrate de crear contenido valioso, relevante y que genere engagement."""
+            lines.append(orjson.dumps({
+                "custom_id": f"idea-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "response_format": _LINKEDIN_POST_RESPONSE_FORMAT,
+                    "temperature": 0.7,
+                    "max_tokens": self.max_tokens
+                }
+            }))
+        jsonl_content = b'\n'.join(lines)
+
+        try:
+            # Subir el archivo y crear el lote
+            batch_file = await self.client.files.create(
+                file=("linkedin_posts_batch.jsonl", jsonl_content),
+                purpose="batch"
+            )
+
+            batch = await self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+
+            # Esperar a que el lote termine, con sondeo cada vez más espaciado
+            poll_interval = 5
+            while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, 60)
+                batch = await self.client.batches.retrieve(batch.id)
+
+            if batch.status != 'completed':
+                raise ValueError(
+                    f"El lote terminó con estado '{batch.status}'. "
+                    "Revisa el estado del lote en https://platform.openai.com/batches"
+                )
+
+            # Descargar los resultados y reconstruir los posts en orden
+            output = await self.client.files.content(batch.output_file_id)
+            posts_by_id = {}
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                result = orjson.loads(line)
+
+                error = result.get('error') or result['response']['body'].get('error')
+                if error:
+                    raise ValueError(
+                        f"La petición '{result['custom_id']}' falló: {error}"
+                    )
+
+                content = result['response']['body']['choices'][0]['message']['content']
+                posts_by_id[result['custom_id']] = LinkedinPost.model_validate_json(content)
+
+            missing = [f"idea-{i}" for i in range(len(ideas)) if f"idea-{i}" not in posts_by_id]
+            if missing:
+                raise ValueError(
+                    f"El lote no devolvió resultados para: {', '.join(missing)}"
+                )
+
+            return [posts_by_id[f"idea-{i}"] for i in range(len(ideas))]
+
+        except ValidationError as e:
+            # Error de validación de Pydantic
+            error_messages = []
+            for error in e.errors():
+                field = ' -> '.join(str(loc) for loc in error['loc'])
+                message = error['msg']
+                error_messages.append(f"  - {field}: {message}")
+
+            raise ValueError(
+                "Error en la validación de los posts generados:\n" +
+                '\n'.join(error_messages) +
+                "\n\nPor favor, intenta con ideas diferentes o más específicas."
+            )
+
+        except OpenAIError as e:
+            raise OpenAIError(f"Error de la API de OpenAI al procesar el lote: {str(e)}")
+
+    def generate_linkedin_posts_batch(self, ideas: List[str]) -> List[LinkedinPost]:
+        """
+        Versión síncrona de agenerate_linkedin_posts_batch (compatibilidad hacia atrás)
+
+        Args:
+            ideas: Lista de ideas o temas, uno por post
+
+        Returns:
+            List[LinkedinPost]: Lista de posts validados, en el orden de las ideas
+        """
+        return self._run_sync(self.agenerate_linkedin_posts_batch(ideas))
+
+    def generate_linkedin_posts(self, ideas: List[str]) -> List[LinkedinPost]:
+        """
+        Versión síncrona de agenerate_linkedin_posts (compatibilidad hacia atrás)
+
+        Args:
+            ideas: Lista de ideas o temas, uno por post
+
+        Returns:
+            List[LinkedinPost]: Lista de posts validados, uno por idea
+        """
+        return self._run_sync(self.agenerate_linkedin_posts(ideas))
+
+    def generate_linkedin_post(self, user_idea: str) -> LinkedinPost:
+        """
+        Versión síncrona de agenerate_linkedin_post (compatibilidad hacia atrás)
+
+        Args:
+            user_idea: Idea o tema del post proporcionado por el usuario
+
+        Returns:
+            LinkedinPost: Objeto validado con el post generado
+        """
+        return self._run_sync(self.agenerate_linkedin_post(user_idea))
+
+    async def aclose(self):
+        """Cierra el cliente HTTP y libera las conexiones del pool"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._http_client = None
+            self._client_loop = None
+
+    async def atest_connection(self) -> bool:
+        """
+        Verifica que la conexión con OpenAI funcione correctamente (asíncrono)
+
+        Consulta los metadatos del modelo en lugar de generar una
+        completion: valida key y conectividad sin facturar tokens. Se
+        mantiene como herramienta de diagnóstico; el arranque normal ya
+        no la invoca.
+
+        Returns:
+            bool: True si la conexión es exitosa
+
+        Raises:
+            Exception: Si hay algún problema con la conexión
+        """
+        try:
+            # Llamada barata de metadatos: no consume tokens
+            await self.client.models.retrieve(self.model)
+            return True
+        except AuthenticationError:
+            raise Exception(
+                "API key inválida. Verifica que tu OPENAI_API_KEY sea correcta."
+            )
+        except Exception as e:
+            raise Exception(f"Error al probar la conexión con OpenAI: {str(e)}")
+
+    def test_connection(self) -> bool:
+        """
+        Versión síncrona de atest_connection (compatibilidad hacia atrás)
+
+        Returns:
+            bool: True si la conexión es exitosa
+        """
+        return self._run_sync(self.atest_connection())
@@ -1,11 +1,15 @@
 """
 Clase principal del chatbot para generar posts de LinkedIn
 """
+import asyncio
+import os
 import sys
-from typing import Optional
-from core.api_client import OpenAIClient
-from models.linkedin_post import LinkedinPost
-from openai import OpenAIError
+from typing import TYPE_CHECKING, List, Optional
+
+# Los imports pesados (openai, pydantic vía api_client/models) se difieren
+# a los métodos que los usan para no pagar su coste al arrancar el CLI
+if TYPE_CHECKING:
+    from models.linkedin_post import LinkedinPost
 
 
 class LinkedinChatbot:
@@ -13,19 +17,64 @@ class LinkedinChatbot:
     Chatbot interactivo por terminal para generar posts de LinkedIn
     """
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-2024-08-06"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-2024-08-06",
+                 use_cache: bool = True):
         """
         Inicializa el chatbot
-        
+
         Args:
             api_key: API key de OpenAI (opcional, se puede usar variable de entorno)
             model: Modelo de OpenAI a utilizar
+            use_cache: Si se reutilizan posts ya generados para la misma idea
         """
         self.api_client = None
         self.api_key = api_key
         self.model = model
+        self.use_cache = use_cache
         self.is_running = False
-    
+        self._prompt_session = None
+        # Posts generados en la sesión actual (para el comando 'guardar')
+        self.generated_posts: 'List[LinkedinPost]' = []
+
+    # Archivo donde se persiste el historial de ideas entre sesiones
+    HISTORY_FILE = '.linkedin_history'
+
+    async def _prompt_async(self, text: str) -> str:
+        """
+        Lee una línea del usuario con historial y edición de línea
+
+        Usa prompt_toolkit (flechas para recuperar ideas anteriores,
+        historial persistente en disco) cuando está disponible; si no,
+        cae de vuelta a input() en un hilo. No bloquea el bucle de
+        eventos: mientras el usuario escribe, las generaciones en curso
+        siguen avanzando en segundo plano.
+
+        Args:
+            text: Texto a mostrar antes de la entrada
+
+        Returns:
+            str: Línea introducida por el usuario
+        """
+        try:
+            if self._prompt_session is None:
+                from prompt_toolkit import PromptSession
+                from prompt_toolkit.history import FileHistory
+                self._prompt_session = PromptSession(history=FileHistory(self.HISTORY_FILE))
+            return await self._prompt_session.prompt_async(text)
+        except (ImportError, OSError):
+            # Sin prompt_toolkit: input() en un hilo para no bloquear el loop
+            return await asyncio.to_thread(input, text)
+
+    async def __aenter__(self):
+        """Permite usar el chatbot como context manager asíncrono"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Cierra el cliente HTTP al salir del contexto"""
+        if self.api_client:
+            await self.api_client.aclose()
+        return False
+
     def initialize(self) -> bool:
         """
         Inicializa el cliente de OpenAI y verifica la conexión
@@ -34,13 +83,19 @@ class LinkedinChatbot:
             bool: True si la inicialización fue exitosa
         """
         try:
+            from core.api_client import OpenAIClient
+
             print("🔄 Inicializando cliente de OpenAI...")
-            self.api_client = OpenAIClient(api_key=self.api_key, model=self.model)
-            
-            print("🔍 Verificando conexión con OpenAI...")
-            self.api_client.test_connection()
-            
-            print("✅ Conexión establecida exitosamente")
+            self.api_client = OpenAIClient(
+                api_key=self.api_key,
+                model=self.model,
+                use_cache=self.use_cache
+            )
+
+            # Sin llamada de prueba a la API: costaba una petición facturada
+            # y varios segundos en cada arranque. Si la key es inválida, la
+            # primera generación real lo informa con el mismo mensaje.
+            print("✅ Cliente inicializado")
             print(f"📱 Usando modelo: {self.model}\n")
             return True
             
@@ -91,6 +146,10 @@ Comandos disponibles:
   • salir / exit / quit    → Termina el programa
   • ayuda / help           → Muestra esta ayuda
   • ejemplos               → Muestra ejemplos de ideas para posts
+  • lote <archivo>         → Genera un post por cada idea del archivo
+                             (una idea por línea, una sola llamada a la API)
+  • limpiar-cache          → Vacía el caché local de posts generados
+  • guardar [archivo]      → Guarda los posts de la sesión en un archivo
 
 Cómo usar el generador:
   1. Describe tu idea de forma clara y concisa
@@ -133,158 +192,318 @@ Ejemplo de entrada:
 """
         print(examples_text)
     
-    def get_user_input(self) -> Optional[str]:
+    def _process_command(self, user_input: str) -> Optional[str]:
         """
-        Solicita y procesa la entrada del usuario
-        
+        Procesa los comandos especiales de la entrada del usuario
+
+        Args:
+            user_input: Entrada del usuario ya sin espacios laterales
+
         Returns:
-            str: Entrada del usuario procesada, o None si quiere salir
+            str: La idea a generar, '' si era un comando ya atendido,
+                 o None si el usuario quiere salir
         """
-        try:
-            print("\n" + "─" * 70)
-            user_input = input("\n💭 Describe tu idea para el post:\n> ").strip()
-            
-            if not user_input:
-                print("⚠️  No puedes dejar la entrada vacía. Intenta de nuevo.")
-                return ""
-            
-            # Comandos especiales
-            if user_input.lower() in ['salir', 'exit', 'quit']:
-                return None
-            
-            if user_input.lower() in ['ayuda', 'help']:
-                self.show_help()
-                return ""
-            
-            if user_input.lower() in ['ejemplos', 'examples']:
-                self.show_examples()
-                return ""
-            
-            return user_input
-            
-        except KeyboardInterrupt:
-            print("\n\n⚠️  Interrupción detectada. Saliendo...")
-            return None
-        except EOFError:
+        if not user_input:
+            print("⚠️  No puedes dejar la entrada vacía. Intenta de nuevo.")
+            return ""
+
+        lowered = user_input.lower()
+
+        if lowered in ['salir', 'exit', 'quit']:
             return None
-    
-    def generate_and_display_post(self, user_idea: str) -> bool:
+
+        if lowered in ['ayuda', 'help']:
+            self.show_help()
+            return ""
+
+        if lowered in ['ejemplos', 'examples']:
+            self.show_examples()
+            return ""
+
+        if lowered in ['limpiar-cache', 'limpiar cache']:
+            if self.api_client:
+                count = self.api_client.clear_cache()
+                print(f"🗑️  Caché vaciado ({count} entradas eliminadas).")
+            return ""
+
+        # Solo la palabra exacta (con o sin argumento) es un comando: una idea
+        # que empiece por "guardaremos..." debe generar un post, no guardarlos
+        if lowered == 'guardar' or lowered.startswith('guardar '):
+            if not self.generated_posts:
+                print("⚠️  Todavía no hay posts generados en esta sesión.")
+                return ""
+            filename = user_input[7:].strip() or "linkedin_posts.txt"
+            try:
+                saved_path = self.save_posts(self.generated_posts, filename)
+                print(f"✅ {len(self.generated_posts)} posts guardados en: {saved_path}")
+            except Exception as e:
+                print(f"⚠️  No se pudo guardar el archivo: {e}")
+            return ""
+
+        return user_input
+
+    async def agenerate_batch_from_file(self, filepath: str) -> bool:
         """
-        Genera y muestra un post de LinkedIn basado en la idea del usuario
-        
+        Genera un lote de posts a partir de un archivo de ideas (asíncrono)
+
+        El archivo debe contener una idea por línea. Todas las ideas se
+        envían en una sola llamada a la API y el lote completo se guarda
+        en un único archivo.
+
         Args:
-            user_idea: Idea proporcionada por el usuario
-        
+            filepath: Ruta al archivo con las ideas
+
         Returns:
             bool: True si la generación fue exitosa
         """
         try:
-            print("\n🤖 Generando post de LinkedIn...")
+            with open(filepath, 'r', encoding='utf-8') as f:
+                ideas = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            print(f"\n❌ No se pudo leer el archivo '{filepath}': {e}")
+            return False
+
+        if not ideas:
+            print(f"\n⚠️  El archivo '{filepath}' no contiene ideas.")
+            return False
+
+        from openai import OpenAIError
+
+        try:
+            print(f"\n🤖 Generando {len(ideas)} posts de LinkedIn en una sola llamada...")
             print("⏳ Esto puede tomar unos segundos...\n")
-            
-            # Generar el post usando la API
-            post = self.api_client.generate_linkedin_post(user_idea)
-            
-            # Mostrar el resultado
-            print("\n✨ ¡Post generado exitosamente! ✨")
-            print(post.format_for_display())
-            
-            # Preguntar si quiere guardar el post
-            self.offer_save_option(post)
-            
+
+            posts = await self.api_client.agenerate_linkedin_posts(ideas)
+
+            print(f"\n✨ ¡{len(posts)} posts generados exitosamente! ✨")
+
+            for post in posts:
+                print(post.format_for_display())
+
+            # Todo el lote se guarda en un único archivo con una sola escritura
+            saved_path = self.save_posts(posts, "linkedin_posts_lote.txt")
+            print(f"✅ {len(posts)} posts guardados en: {saved_path}")
+
+            self.generated_posts.extend(posts)
             return True
-            
+
         except ValueError as e:
             print(f"\n❌ Error de validación: {e}")
-            print("\n💡 Sugerencias:")
-            print("   • Intenta ser más específico en tu idea")
-            print("   • Asegúrate de que el tema sea apropiado")
-            print("   • Revisa que tu descripción tenga suficiente detalle")
             return False
-            
+
         except OpenAIError as e:
             print(f"\n❌ Error de la API de OpenAI: {e}")
-            print("\n💡 Posibles soluciones:")
-            print("   • Verifica tu conexión a internet")
-            print("   • Comprueba que tu API key sea válida")
-            print("   • Revisa tu cuota en platform.openai.com")
             return False
-            
+
         except Exception as e:
             print(f"\n❌ Error inesperado: {e}")
-            print("\n💡 Por favor, intenta de nuevo o contacta al soporte")
             return False
-    
-    def offer_save_option(self, post: LinkedinPost):
+
+    def generate_batch_from_file(self, filepath: str) -> bool:
         """
-        Ofrece la opción de guardar el post en un archivo
-        
+        Versión síncrona de agenerate_batch_from_file (compatibilidad hacia atrás)
+
+        Args:
+            filepath: Ruta al archivo con las ideas
+
+        Returns:
+            bool: True si la generación fue exitosa
+        """
+        return asyncio.run(self.agenerate_batch_from_file(filepath))
+
+    def save_posts(self, posts: 'List[LinkedinPost]', path: str, fmt: str = 'txt') -> str:
+        """
+        Guarda uno o varios posts en un único archivo
+
+        Todo el lote se escribe en un solo bloque con búfer grande (un
+        open/close por lote en vez de uno por post) y se publica con
+        os.replace, de modo que el archivo final aparece completo o no
+        aparece (escritura atómica).
+
         Args:
-            post: Post de LinkedIn generado
+            posts: Posts de LinkedIn a guardar
+            path: Ruta del archivo destino
+            fmt: Formato de salida: 'txt' (legible) o 'jsonl' (un JSON por línea)
+
+        Returns:
+            str: Ruta del archivo escrito
+
+        Raises:
+            ValueError: Si el formato no es 'txt' ni 'jsonl'
         """
-        try:
-            save_input = input("\n💾 ¿Deseas guardar este post en un archivo? (s/n): ").strip().lower()
-            
-            if save_input in ['s', 'si', 'sí', 'y', 'yes']:
-                filename = input("📁 Nombre del archivo (sin extensión): ").strip()
-                if not filename:
-                    filename = "linkedin_post"
-                
-                filename = f"{filename}.txt"
-                
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(post.format_for_display())
-                
-                print(f"✅ Post guardado exitosamente en: {filename}")
-        
-        except Exception as e:
-            print(f"⚠️  No se pudo guardar el archivo: {e}")
-    
-    def run(self):
+        if fmt not in ('txt', 'jsonl'):
+            raise ValueError(f"Formato no soportado: '{fmt}'. Usa 'txt' o 'jsonl'.")
+
+        tmp_path = f"{path}.tmp"
+        if fmt == 'jsonl':
+            # orjson serializa a bytes UTF-8 directamente (sin re-encode)
+            # y añade el salto de línea en la misma llamada
+            import orjson
+            with open(tmp_path, 'wb', buffering=1 << 16) as f:
+                for post in posts:
+                    f.write(orjson.dumps(post.model_dump(), option=orjson.OPT_APPEND_NEWLINE))
+        else:
+            with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+                f.write('\n\n'.join(post.format_for_display() for post in posts))
+
+        os.replace(tmp_path, path)
+        return path
+
+    async def _input_loop(self, ideas: asyncio.Queue):
         """
-        Ejecuta el bucle principal del chatbot
+        Productor: lee ideas del usuario y las encola
+
+        Mientras la API genera el post anterior, el usuario ya puede
+        escribir la siguiente idea: la espera de red queda oculta tras
+        el tiempo de tecleo.
+        """
+        while self.is_running:
+            try:
+                print("\n" + "─" * 70)
+                user_input = (await self._prompt_async("\n💭 Describe tu idea para el post:\n> ")).strip()
+            except (KeyboardInterrupt, EOFError):
+                print("\n\n⚠️  Interrupción detectada. Saliendo...")
+                user_input = 'salir'
+
+            # El lote es una operación propia: se espera aquí mismo. Solo la
+            # palabra exacta es un comando: una idea que empiece por "lotes..."
+            # debe generar un post, no leer un archivo
+            lowered = user_input.lower()
+            if lowered == 'lote' or lowered.startswith('lote '):
+                filepath = user_input[4:].strip()
+                if not filepath:
+                    print("⚠️  Uso: lote <archivo>  (una idea por línea)")
+                else:
+                    await self.agenerate_batch_from_file(filepath)
+                continue
+
+            processed = self._process_command(user_input)
+
+            if processed is None:
+                self.is_running = False
+                await ideas.put(None)  # Centinela: no habrá más ideas
+                break
+
+            if not processed:
+                continue
+
+            await ideas.put(processed)
+            print("🤖 Generando en segundo plano... puedes escribir la siguiente idea.")
+
+    async def _worker_loop(self, ideas: asyncio.Queue, results: asyncio.Queue):
+        """
+        Consumidor: genera los posts de las ideas encoladas
+
+        El contenido se emite en streaming a medida que llega de la API,
+        así el usuario ve progreso casi de inmediato aunque la generación
+        corra en segundo plano (patch_stdout lo muestra sobre el prompt).
+        """
+        from openai import OpenAIError
+
+        # Los fragmentos se muestran según llegan de la API
+        def mostrar_delta(delta: str):
+            sys.stdout.write(delta)
+            sys.stdout.flush()
+
+        while True:
+            idea = await ideas.get()
+
+            if idea is None:
+                await results.put(None)  # Propagar el centinela al display
+                break
+
+            try:
+                sys.stdout.write('\n')
+                post = await self.api_client.astream_linkedin_post(idea, on_delta=mostrar_delta)
+                sys.stdout.write('\n')
+                sys.stdout.flush()
+                await results.put(post)
+
+            except ValueError as e:
+                print(f"\n❌ Error de validación: {e}")
+                print("💡 Intenta ser más específico en tu idea.")
+
+            except OpenAIError as e:
+                print(f"\n❌ Error de la API de OpenAI: {e}")
+                print("💡 Revisa tu conexión, tu API key y tu cuota.")
+
+            except Exception as e:
+                print(f"\n❌ Error inesperado: {e}")
+
+    async def _display_loop(self, results: asyncio.Queue):
+        """
+        Muestra los posts generados a medida que llegan
+        """
+        while True:
+            post = await results.get()
+
+            if post is None:
+                break
+
+            print("\n✨ ¡Post generado exitosamente! ✨")
+            print(post.format_for_display())
+            self.generated_posts.append(post)
+            print("💾 Usa 'guardar [archivo]' para guardar los posts de la sesión.")
+
+    async def run_async(self):
+        """
+        Ejecuta el bucle principal del chatbot (asíncrono)
+
+        Tres corrutinas cooperan sobre dos colas: la entrada del usuario
+        (productor), la generación vía API (consumidor) y la presentación
+        de resultados. Así la latencia de la API se solapa con el tiempo
+        en que el usuario piensa y teclea la siguiente idea.
         """
         # Mostrar bienvenida
         self.show_welcome()
-        
+
         # Inicializar cliente de OpenAI
         if not self.initialize():
             print("\n❌ No se pudo inicializar el chatbot. Verifica tu configuración.")
             print("💡 Asegúrate de tener configurada la variable de entorno OPENAI_API_KEY")
             return
-        
+
         print("🎯 ¡Listo para generar posts! Escribe tu primera idea.\n")
-        
-        # Bucle principal
+
+        ideas: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+
+        # Redirigir stdout mientras hay un prompt activo: lo que impriman
+        # el worker y el display aparece encima de la línea que el usuario
+        # está escribiendo en vez de romperla por la mitad
+        try:
+            from prompt_toolkit.patch_stdout import patch_stdout
+            salida_protegida = patch_stdout()
+        except ImportError:
+            # Sin prompt_toolkit tampoco hay prompt que proteger
+            import contextlib
+            salida_protegida = contextlib.nullcontext()
+
         self.is_running = True
-        while self.is_running:
-            try:
-                # Obtener entrada del usuario
-                user_input = self.get_user_input()
-                
-                # Verificar si quiere salir
-                if user_input is None:
-                    self.is_running = False
-                    break
-                
-                # Saltar si la entrada está vacía (comando de ayuda/ejemplos)
-                if not user_input:
-                    continue
-                
-                # Generar y mostrar el post
-                self.generate_and_display_post(user_input)
-                
-            except KeyboardInterrupt:
-                print("\n\n⚠️  Interrupción detectada.")
-                self.is_running = False
-                break
-            
-            except Exception as e:
-                print(f"\n❌ Error inesperado en el bucle principal: {e}")
-                print("💡 El programa continuará ejecutándose...\n")
-        
+        try:
+            with salida_protegida:
+                await asyncio.gather(
+                    self._input_loop(ideas),
+                    self._worker_loop(ideas, results),
+                    self._display_loop(results),
+                )
+        finally:
+            # Liberar las conexiones del pool HTTP
+            if self.api_client:
+                await self.api_client.aclose()
+
         # Mensaje de despedida
         self.show_goodbye()
+
+    def run(self):
+        """
+        Ejecuta el bucle principal del chatbot
+        """
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Interrupción detectada.")
+            self.show_goodbye()
     
     def show_goodbye(self):
         """Muestra el mensaje de despedida"""
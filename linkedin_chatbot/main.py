@@ -3,19 +3,18 @@ Punto de entrada principal del Generador de Posts de LinkedIn
 """
 import sys
 import os
-from dotenv import load_dotenv
 
 # Agregar el directorio actual al path para imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from core.chatbot import LinkedinChatbot
-
 
 def main():
     """
     Función principal que inicializa y ejecuta el chatbot
     """
     # Cargar variables de entorno desde archivo .env
+    # (import diferido: evita pagar el coste de arranque si solo falla la key)
+    from dotenv import load_dotenv
     load_dotenv()
     
     # Verificar que existe la API key
@@ -33,12 +32,18 @@ def main():
         print("\n" + "="*70 + "\n")
         sys.exit(1)
     
+    # Importar el chatbot solo cuando la API key ya está verificada:
+    # la cadena core.chatbot → api_client → openai tarda cientos de ms
+    # y no aporta nada en la ruta de error
+    from core.chatbot import LinkedinChatbot
+
     try:
         # Crear instancia del chatbot
         # Puedes cambiar el modelo aquí si lo deseas
         chatbot = LinkedinChatbot(
             api_key=api_key,
-            model="gpt-4o-2024-08-06"  # Modelo compatible con Structured Outputs
+            model="gpt-4o-2024-08-06",  # Modelo compatible con Structured Outputs
+            use_cache='--no-cache' not in sys.argv  # Desactivar caché con --no-cache
         )
         
         # Ejecutar el chatbot
@@ -1,6 +1,11 @@
 """
 Módulo de modelos Pydantic para el chatbot de LinkedIn
 """
-from .linkedin_post import LinkedinPost
+from .linkedin_post import (
+    LinkedinPost,
+    PostBatch,
+    LINKEDIN_POST_SCHEMA,
+    POST_BATCH_SCHEMA,
+)
 
-__all__ = ['LinkedinPost']
+__all__ = ['LinkedinPost', 'PostBatch', 'LINKEDIN_POST_SCHEMA', 'POST_BATCH_SCHEMA']
@@ -1,10 +1,47 @@
 """
 Modelo Pydantic para posts de LinkedIn con validación estricta
 """
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, model_validator, ConfigDict
 from typing import List
 
 
+# Mapa canónico de categorías, calculado una sola vez a nivel de módulo.
+# Acepta variantes sin tilde, con guion bajo o abreviadas, y la validación
+# se reduce a una única búsqueda en el diccionario.
+_CATEGORY_CANONICAL = {
+    'tecnología': 'Tecnología',
+    'tecnologia': 'Tecnología',
+    'negocios': 'Negocios',
+    'marketing': 'Marketing',
+    'liderazgo': 'Liderazgo',
+    'desarrollo profesional': 'Desarrollo Profesional',
+    'industria': 'Industria',
+    'innovación': 'Innovación',
+    'innovacion': 'Innovación',
+    'recursos humanos': 'Recursos Humanos',
+    'rrhh': 'Recursos Humanos',
+}
+
+
+# Plantilla de presentación construida una sola vez a nivel de módulo:
+# cada llamada a format_for_display rellena los huecos sin reconstruir
+# las barras separadoras ni una lista temporal de hashtags
+_BAR = '=' * 60
+_DISPLAY_TEMPLATE = f"""
+{_BAR}
+📌 TÍTULO: {{title}}
+{_BAR}
+
+📝 CONTENIDO:
+{{content}}
+
+{_BAR}
+🏷️  HASHTAGS: #{{hashtags}}
+📂 CATEGORÍA: {{category}}
+{_BAR}
+"""
+
+
 class LinkedinPost(BaseModel):
     """
     Modelo que representa un post de LinkedIn estructurado.
@@ -16,23 +53,27 @@ class LinkedinPost(BaseModel):
     - category: Categoría del post (debe ser una de las categorías válidas)
     """
     
-    # Configuración estricta del modelo
+    # Configuración estricta del modelo. Las comprobaciones baratas
+    # (strip, longitudes, no-vacío) las hace pydantic-core compilado;
+    # solo la normalización con lógica propia queda en Python.
     model_config = ConfigDict(
         str_strip_whitespace=True,  # Elimina espacios en blanco al inicio y final
-        extra='forbid'  # No permite campos adicionales no definidos
+        extra='forbid',  # No permite campos adicionales no definidos
+        frozen=True  # Instancias inmutables una vez validadas
     )
-    
+
     title: str = Field(
         ...,  # Campo obligatorio
         min_length=10,
         max_length=100,
         description="Título llamativo y descriptivo para el post de LinkedIn"
     )
-    
+
     content: str = Field(
         ...,  # Campo obligatorio
         min_length=50,
         max_length=3000,
+        pattern=r"\S",  # Debe contener texto real, no solo espacios
         description="Contenido principal del post con información valiosa y profesional"
     )
     
@@ -48,107 +89,93 @@ class LinkedinPost(BaseModel):
         description="Categoría del post: tecnología, negocios, marketing, liderazgo, desarrollo profesional, industria, innovación, recursos humanos"
     )
     
-    @field_validator('title')
-    @classmethod
-    def validate_title(cls, v: str) -> str:
-        """Valida que el título no esté vacío después de limpiar espacios"""
-        if not v or not v.strip():
-            raise ValueError("El título no puede estar vacío")
-        return v.strip()
-    
-    @field_validator('content')
-    @classmethod
-    def validate_content(cls, v: str) -> str:
-        """Valida que el contenido sea sustancial"""
-        cleaned = v.strip()
-        if not cleaned:
-            raise ValueError("El contenido no puede estar vacío")
-        
-        # Verificar que tenga contenido real (no solo espacios o saltos de línea)
-        if len(cleaned.replace('\n', '').replace('\r', '').strip()) < 50:
-            raise ValueError("El contenido debe tener al menos 50 caracteres de texto real")
-        
-        return cleaned
-    
-    @field_validator('hashtags')
-    @classmethod
-    def validate_hashtags(cls, v: List[str]) -> List[str]:
-        """Valida que los hashtags sean válidos"""
-        if not v:
-            raise ValueError("Debe proporcionar al menos 3 hashtags")
-        
-        # Limpiar y validar cada hashtag
-        cleaned_hashtags = []
-        for tag in v:
-            # Eliminar espacios y el símbolo # si está presente
-            cleaned_tag = tag.strip().lstrip('#')
-            
+    @model_validator(mode='after')
+    def _normalize(self) -> 'LinkedinPost':
+        """
+        Normaliza hashtags y categoría tras la validación compilada
+
+        Los strips y comprobaciones de longitud/vacío ya los hizo
+        pydantic-core; aquí solo queda la lógica propia: limpiar el
+        símbolo #, deduplicar y canonicalizar la categoría.
+        """
+        # Limpiar, validar y deduplicar cada hashtag en una sola pasada.
+        # Un único dict (clave en minúsculas, valor limpio) detecta los
+        # duplicados y conserva el orden de inserción a la vez, sin la
+        # lista auxiliar ni la segunda estructura de la versión anterior.
+        seen: dict = {}
+        for tag in self.hashtags:
+            # Eliminar el símbolo # si está presente (ya viene sin espacios laterales)
+            cleaned_tag = tag.lstrip('#')
+
             if not cleaned_tag:
                 raise ValueError("Los hashtags no pueden estar vacíos")
-            
-            if ' ' in cleaned_tag:
+
+            if any(c.isspace() for c in cleaned_tag):
                 raise ValueError(f"Los hashtags no pueden contener espacios: '{cleaned_tag}'")
-            
+
             if len(cleaned_tag) < 2:
                 raise ValueError(f"Los hashtags deben tener al menos 2 caracteres: '{cleaned_tag}'")
-            
-            # Agregar el hashtag sin el símbolo # (se agregará al mostrar)
-            cleaned_hashtags.append(cleaned_tag)
-        
-        # Verificar duplicados (case insensitive)
-        lowercase_tags = [tag.lower() for tag in cleaned_hashtags]
-        if len(lowercase_tags) != len(set(lowercase_tags)):
-            raise ValueError("No puede haber hashtags duplicados")
-        
-        return cleaned_hashtags
-    
-    @field_validator('category')
-    @classmethod
-    def validate_category(cls, v: str) -> str:
-        """Valida que la categoría sea una de las permitidas"""
-        valid_categories = {
-            'tecnología', 'tecnologia',
-            'negocios',
-            'marketing',
-            'liderazgo',
-            'desarrollo profesional', 'desarrollo_profesional',
-            'industria',
-            'innovación', 'innovacion',
-            'recursos humanos', 'recursos_humanos', 'rrhh'
-        }
-        
-        category_lower = v.lower().strip()
-        
-        # Normalizar categorías con espacios o guiones bajos
-        category_normalized = category_lower.replace('_', ' ')
-        
-        if category_normalized not in valid_categories:
+
+            # Verificar duplicados (case insensitive) sobre la marcha
+            lowercase_tag = cleaned_tag.lower()
+            if lowercase_tag in seen:
+                raise ValueError("No puede haber hashtags duplicados")
+
+            # Guardar el hashtag sin el símbolo # (se agregará al mostrar)
+            seen[lowercase_tag] = cleaned_tag
+
+        cleaned_hashtags = list(seen.values())
+
+        # Resolver la categoría contra el mapa canónico (una sola búsqueda)
+        key = self.category.lower().replace('_', ' ')
+        canonical = _CATEGORY_CANONICAL.get(key)
+
+        if canonical is None:
             raise ValueError(
-                f"Categoría inválida: '{v}'. Debe ser una de: "
+                f"Categoría inválida: '{self.category}'. Debe ser una de: "
                 "tecnología, negocios, marketing, liderazgo, desarrollo profesional, "
                 "industria, innovación, recursos humanos"
             )
-        
-        # Devolver en formato normalizado con mayúscula inicial
-        return category_normalized.title()
-    
+
+        # El modelo es frozen: asignar con object.__setattr__
+        object.__setattr__(self, 'hashtags', cleaned_hashtags)
+        object.__setattr__(self, 'category', canonical)
+        return self
+
     def format_for_display(self) -> str:
         """
         Formatea el post para mostrar en terminal de forma legible
         """
-        hashtags_formatted = ' '.join([f'#{tag}' for tag in self.hashtags])
-        
-        output = f"""
-{'='*60}
-📌 TÍTULO: {self.title}
-{'='*60}
+        # ' #'.join evita la lista temporal de f-strings por hashtag
+        return _DISPLAY_TEMPLATE.format(
+            title=self.title,
+            content=self.content,
+            hashtags=' #'.join(self.hashtags),
+            category=self.category
+        )
 
-📝 CONTENIDO:
-{self.content}
 
-{'='*60}
-🏷️  HASHTAGS: {hashtags_formatted}
-📂 CATEGORÍA: {self.category}
-{'='*60}
-"""
-        return output
+class PostBatch(BaseModel):
+    """
+    Modelo contenedor para generar varios posts en una sola llamada a la API.
+
+    Permite amortizar el prompt del sistema y la latencia de red entre
+    todos los posts de un lote.
+    """
+
+    # Configuración estricta, igual que LinkedinPost (requisito del modo
+    # strict de Structured Outputs: additionalProperties debe ser false)
+    model_config = ConfigDict(extra='forbid')
+
+    posts: List[LinkedinPost] = Field(
+        ...,  # Campo obligatorio
+        min_length=1,
+        description="Lista de posts de LinkedIn, uno por cada idea solicitada"
+    )
+
+
+# Esquemas JSON generados una sola vez al cargar el módulo. La introspección
+# de model_json_schema() no es gratis y el resultado es siempre el mismo:
+# cachearlo evita reconstruir el mismo dict en cada llamada a la API.
+LINKEDIN_POST_SCHEMA = LinkedinPost.model_json_schema()
+POST_BATCH_SCHEMA = PostBatch.model_json_schema()